@@ -1,26 +1,45 @@
 """UVC Price Checker Backend API (optimizado con caché y logging)"""
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from datetime import datetime
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, model_validator
+from contextlib import asynccontextmanager
+from datetime import datetime, date
+from functools import lru_cache
 import httpx
+import orjson
 from typing import List, Optional
 import asyncio
+import logging
+import queue
+import sqlite3
+import sys
 import time
-from bs4 import BeautifulSoup
+from logging.handlers import QueueHandler, QueueListener
+from cachetools import TLRUCache, TTLCache
+from collections import deque
 from starlette.staticfiles import StaticFiles
 import os
 
 
 class PriceRequest(BaseModel):
     destination: str
-    checkin: str
-    checkout: str
+    # pydantic-core parsea fechas ISO en Rust; formato inválido → 422 automático
+    checkin: date
+    checkout: date
     guests: int = 2
     rooms: int = 1
     force_refresh: bool = False
 
+    @model_validator(mode="after")
+    def validar_fechas(self):
+        if self.checkin >= self.checkout:
+            raise ValueError("Check-out debe ser después de check-in")
+        if self.checkin < date.today():
+            raise ValueError("Check-in debe ser fecha futura")
+        return self
+
 
 class PriceResult(BaseModel):
     source: str
@@ -43,7 +62,50 @@ class PriceComparison(BaseModel):
     timestamp: str
 
 
-app = FastAPI(title="UVC Price Checker API", version="1.2.0")
+def _make_transport():
+    """Transporte aiohttp opcional: bajo fan-out concurrente aiohttp rinde
+    mejor que el transporte nativo de httpx. Si no está instalado
+    (httpx-aiohttp + aiohttp), httpx usa su transporte por defecto."""
+    try:
+        import aiohttp
+        from httpx_aiohttp import AiohttpTransport
+    except ImportError:
+        return None
+    return AiohttpTransport(
+        client=aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20))
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Cliente HTTP compartido: un solo pool de conexiones para todas las
+    # llamadas a RapidAPI, evita rehacer TCP + TLS en cada request.
+    # Timeouts por fase: connect/write/pool cortos para fallar rápido si la
+    # agencia no responde; read más largo porque la búsqueda tarda en generarse.
+    # keepalive_expiry alto mantiene vivas las conexiones TLS entre ráfagas.
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(connect=5.0, read=20.0, write=5.0, pool=5.0),
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=100,
+            keepalive_expiry=30.0,
+        ),
+        follow_redirects=True,
+        transport=_make_transport(),
+    )
+    _log_listener.start()
+    init_cache_db()
+    sweeper = asyncio.create_task(expire_caches_loop())
+    yield
+    sweeper.cancel()
+    await app.state.http.aclose()
+    _log_listener.stop()
+
+
+# ORJSONResponse: serialización de respuestas vía orjson (C) en vez de json stdlib
+app = FastAPI(title="UVC Price Checker API", version="1.2.0",
+              default_response_class=ORJSONResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -69,60 +131,221 @@ HOTELS_CONFIG = {
     }
 }
 
+# Mapeo destination → hotel configurado, claves ya en minúsculas para el
+# matching por substring sin lowercasing repetido en el request path
+HOTEL_MAPPING = {
+    "secrets puerto los cabos": "Secrets Puerto Los Cabos",
+    "zoetry los cabos": "Zoetry Los Cabos",
+    "secrets": "Secrets Puerto Los Cabos",
+    "zoetry": "Zoetry Los Cabos",
+}
+
+# Lista de búsqueda ordenada por longitud descendente: la clave más específica
+# ("secrets puerto los cabos") matchea antes que la genérica ("secrets"),
+# independientemente del orden de inserción del dict.
+HOTEL_LOOKUP = sorted(HOTEL_MAPPING.items(), key=lambda kv: len(kv[0]), reverse=True)
+
 # API Keys (configurar en Railway como variables de entorno)
 RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY", "")  # Para Booking/Expedia en RapidAPI
 
 # ------------------ CACHÉ ------------------
-CACHE_TTL_SECONDS = 600
-price_cache: dict = {}
+# Caché acotada con TTL adaptativo por clave: expira en O(1) y limita memoria
+# aunque lleguen combinaciones destino/fechas únicas sin parar.
+CACHE_TTL_SECONDS = 600          # frescura de la copia persistente
+CACHE_COLD_TTL_SECONDS = 300     # claves sin historial de accesos
+CACHE_MIN_TTL_SECONDS = 60
+CACHE_MAX_TTL_SECONDS = 3600
+CACHE_MAX_ENTRIES = 10_000
+NEGATIVE_TTL_SECONDS = 30
+
+# Historial de accesos recientes por clave (timestamps monotónicos)
+_key_hits: TTLCache = TTLCache(maxsize=CACHE_MAX_ENTRIES, ttl=CACHE_MAX_TTL_SECONDS, timer=time.monotonic)
+
+def _price_ttu(key, value, now):
+    """TTL adaptativo: un TTL uniforme sobre-cachea destinos fríos y
+    sub-cachea rangos de fechas calientes. Con historial suficiente, la
+    entrada vive ~1.5x su intervalo medio entre accesos (acotado)."""
+    hits = _key_hits.get(key)
+    if hits is not None and len(hits) >= 5:
+        mean_gap = (hits[-1] - hits[0]) / (len(hits) - 1)
+        return now + min(max(mean_gap * 1.5, CACHE_MIN_TTL_SECONDS), CACHE_MAX_TTL_SECONDS)
+    return now + CACHE_COLD_TTL_SECONDS
+
+# timer=time.monotonic explícito: la expiración no se mueve con ajustes
+# NTP ni cambios de reloj del sistema.
+price_cache: TLRUCache = TLRUCache(maxsize=CACHE_MAX_ENTRIES, ttu=_price_ttu, timer=time.monotonic)
+# Respuestas "negativas" (las APIs no devolvieron precios reales): TTL corto
+# para reintentar pronto sin martillar upstream en cada request.
+negative_cache: TTLCache = TTLCache(maxsize=1_000, ttl=NEGATIVE_TTL_SECONDS, timer=time.monotonic)
+
+async def expire_caches_loop():
+    """Barrido periódico: TTLCache expira entradas al tocar la caché, así que
+    sin tráfico las vencidas seguirían ocupando memoria indefinidamente."""
+    while True:
+        await asyncio.sleep(60)
+        price_cache.expire()
+        negative_cache.expire()
+# Requests en vuelo por clave: N clientes concurrentes con la misma búsqueda
+# comparten un solo fan-out a las agencias en vez de disparar N x 3 llamadas.
+_inflight: dict = {}
 
 def make_cache_key(r: PriceRequest) -> str:
     return f"{r.destination}|{r.checkin}|{r.checkout}|{r.guests}|{r.rooms}"
 
-def get_cached_response(key: str):
-    entry = price_cache.get(key)
-    if not entry:
+# La caché guarda la respuesta ya serializada (bytes orjson): un hit es un
+# write directo al socket, sin re-validar ni re-serializar el modelo.
+def get_cached_response(key: str) -> Optional[bytes]:
+    data = price_cache.get(key)
+    if data is not None:
+        hits = _key_hits.get(key)
+        if hits is None:
+            hits = deque(maxlen=8)
+            _key_hits[key] = hits
+        hits.append(time.monotonic())
+        # Modo renovación: reinsertar recalcula el TTL con el historial nuevo
+        price_cache[key] = data
+        return data
+    return negative_cache.get(key)
+
+def set_cache(key: str, payload: bytes, negative: bool = False):
+    if negative:
+        negative_cache[key] = payload
+    else:
+        price_cache[key] = payload
+        db_set_cached(key, payload)
+
+# ------------------ CACHÉ PERSISTENTE (SQLite) ------------------
+# El TTLCache vive en memoria y muere con cada deploy/restart. SQLite guarda
+# una copia con un TTL duro más largo: tras un restart la entrada se sirve
+# "stale" al instante y se revalida en background (stale-while-revalidate),
+# así el upstream no recibe una ráfaga de fetches con la caché fría.
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "price-cache.db")
+CACHE_HARD_TTL_SECONDS = 3600
+
+_cache_db: Optional[sqlite3.Connection] = None
+
+def init_cache_db():
+    global _cache_db
+    try:
+        _cache_db = sqlite3.connect(CACHE_DB_PATH)
+        _cache_db.execute(
+            "CREATE TABLE IF NOT EXISTS price_cache ("
+            "key TEXT PRIMARY KEY, data BLOB NOT NULL, fresh_until REAL, expires REAL)"
+        )
+        _cache_db.execute("DELETE FROM price_cache WHERE expires < ?", (time.time(),))
+        _cache_db.commit()
+    except Exception as e:
+        logger.warning("Caché persistente no disponible: %s", e)
+        _cache_db = None
+
+def db_get_cached(key: str):
+    """Devuelve (payload bytes, fresh) desde SQLite, o None si no hay entrada viva."""
+    if _cache_db is None:
         return None
-    if entry["expires"] < time.time():
-        price_cache.pop(key, None)
+    try:
+        row = _cache_db.execute(
+            "SELECT data, fresh_until, expires FROM price_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        data, fresh_until, expires = row
+        now = time.time()
+        if expires < now:
+            _cache_db.execute("DELETE FROM price_cache WHERE key = ?", (key,))
+            _cache_db.commit()
+            return None
+        return data, fresh_until >= now
+    except Exception as e:
+        logger.warning("Lectura de caché persistente falló: %s", e)
         return None
-    return entry["data"]
 
-def set_cache(key: str, data: dict):
-    price_cache[key] = {"expires": time.time() + CACHE_TTL_SECONDS, "data": data}
+def db_set_cached(key: str, payload: bytes):
+    if _cache_db is None:
+        return
+    try:
+        now = time.time()
+        _cache_db.execute(
+            "INSERT OR REPLACE INTO price_cache (key, data, fresh_until, expires) VALUES (?, ?, ?, ?)",
+            (key, payload, now + CACHE_TTL_SECONDS, now + CACHE_HARD_TTL_SECONDS),
+        )
+        _cache_db.commit()
+    except Exception as e:
+        logger.warning("Escritura de caché persistente falló: %s", e)
+
+# ------------------ LOGGING ------------------
+# Los logs pasan por una cola y un QueueListener en hilo aparte: el write a
+# stdout sale del event loop y los args % solo se formatean si se emiten.
+logger = logging.getLogger("uvc")
+logger.setLevel(logging.INFO)
+# Cola acotada: si un burst la llena, el handler descarta el registro en vez
+# de dejar crecer la memoria sin límite
+_log_queue: queue.Queue = queue.Queue(maxsize=10_000)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler que descarta en silencio con la cola llena.
+
+    El enqueue de la clase base propaga queue.Full a handleError, que escribe
+    un traceback síncrono a stderr por registro: justo el bloqueo que la cola
+    acotada intenta evitar durante un burst.
+    """
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+logger.addHandler(_DroppingQueueHandler(_log_queue))
+# El listener arranca/para en lifespan, junto al resto de recursos de la app;
+# lo encolado antes del startup se drena cuando arranca.
+_log_listener = QueueListener(_log_queue, logging.StreamHandler(sys.stdout))
 
 # ------------------ MIDDLEWARE LOGGING ------------------
 @app.middleware("http")
 async def timing_middleware(request: Request, call_next):
-    start = time.time()
+    start = time.perf_counter()
     response = await call_next(request)
-    duration = (time.time() - start) * 1000
-    print(f"[REQ] {request.method} {request.url.path} {duration:.1f}ms")
+    duration = (time.perf_counter() - start) * 1000
+    logger.info("[REQ] %s %s %.1fms", request.method, request.url.path, duration)
     response.headers["X-Process-Time-ms"] = f"{duration:.1f}"
     return response
 
 
 # ------------------ FUNCIONES API REALES ------------------
 
-async def fetch_booking_price(hotel_name: str, checkin: str, checkout: str, guests: int):
+# Límite de concurrencia por host upstream: con muchos clientes a la vez,
+# RapidAPI responde 429 y degrada la latencia; acotar el fan-out lo evita.
+# Ajustable al QPS del plan de RapidAPI vía variable de entorno.
+UPSTREAM_CONCURRENCY = int(os.getenv("UPSTREAM_CONCURRENCY", "4"))
+BOOKING_SEM = asyncio.Semaphore(UPSTREAM_CONCURRENCY)
+EXPEDIA_SEM = asyncio.Semaphore(UPSTREAM_CONCURRENCY)
+
+# Partes constantes de cada request upstream, armadas una sola vez al importar
+BOOKING_URL = "https://booking-com15.p.rapidapi.com/api/v1/hotels/searchHotelsByCoordinates"
+BOOKING_HEADERS = {
+    "X-RapidAPI-Key": RAPIDAPI_KEY,
+    "X-RapidAPI-Host": "booking-com15.p.rapidapi.com"
+}
+EXPEDIA_URL = "https://hotels-com-provider.p.rapidapi.com/v2/hotels/search"
+EXPEDIA_HEADERS = {
+    "X-RapidAPI-Key": RAPIDAPI_KEY,
+    "X-RapidAPI-Host": "hotels-com-provider.p.rapidapi.com"
+}
+
+async def fetch_booking_price(client: httpx.AsyncClient, hotel_name: str, checkin: str, checkout: str, guests: int, nights: int, now_iso: str):
     """Fetch real prices from Booking.com API via RapidAPI"""
     if hotel_name not in HOTELS_CONFIG:
-        print(f"[WARN] Hotel {hotel_name} no configurado para Booking.com")
+        logger.warning("Hotel %s no configurado para Booking.com", hotel_name)
         return None
     
-    hotel_id = HOTELS_CONFIG[hotel_name]["booking_id"]
-    
-    # Booking.com API via RapidAPI
-    url = "https://booking-com15.p.rapidapi.com/api/v1/hotels/searchHotelsByCoordinates"
-    
-    headers = {
-        "X-RapidAPI-Key": RAPIDAPI_KEY,
-        "X-RapidAPI-Host": "booking-com15.p.rapidapi.com"
-    }
-    
+    cfg = HOTELS_CONFIG[hotel_name]
+    hotel_id = cfg["booking_id"]
+
     params = {
-        "latitude": HOTELS_CONFIG[hotel_name]["latitude"],
-        "longitude": HOTELS_CONFIG[hotel_name]["longitude"],
+        "latitude": cfg["latitude"],
+        "longitude": cfg["longitude"],
         "checkin_date": checkin,
         "checkout_date": checkout,
         "adults": guests,
@@ -134,132 +357,122 @@ async def fetch_booking_price(hotel_name: str, checkin: str, checkout: str, gues
     }
     
     try:
-        print(f"[INFO] 🔍 Fetching Booking.com price for {hotel_name}...")
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            response = await client.get(url, headers=headers, params=params)
-            
-            if response.status_code != 200:
-                print(f"[ERROR] Booking API status {response.status_code}")
-                return None
-            
-            data = response.json()
-            
-            # Buscar el hotel específico en resultados
-            if "data" in data and "hotels" in data["data"]:
-                for hotel in data["data"]["hotels"]:
-                    if str(hotel.get("hotel_id")) == hotel_id or hotel_name.lower() in hotel.get("property", {}).get("name", "").lower():
-                        price = hotel.get("property", {}).get("priceBreakdown", {}).get("grossPrice", {}).get("value", 0)
-                        if price > 0:
-                            nights = (datetime.strptime(checkout, "%Y-%m-%d") - datetime.strptime(checkin, "%Y-%m-%d")).days
-                            price_per_night = price / nights if nights > 0 else price
-                            print(f"[INFO] ✅ Booking.com: ${price_per_night}/noche")
-                            return PriceResult(
-                                source="Booking.com",
-                                hotel_name=hotel_name,
-                                price_per_night=round(price_per_night, 2),
-                                total_price=round(price, 2),
-                                url=f"https://www.booking.com/hotel/{hotel_id}.html",
-                                last_updated=datetime.now().isoformat()
-                            )
-            
-            print(f"[WARN] Hotel no encontrado en resultados de Booking.com")
+        logger.info("🔍 Fetching Booking.com price for %s...", hotel_name)
+        async with BOOKING_SEM:
+            response = await client.get(BOOKING_URL, headers=BOOKING_HEADERS, params=params)
+
+        if response.status_code != 200:
+            logger.error("Booking API status %s", response.status_code)
             return None
-            
+
+        # orjson parsea el payload (~MB con decenas de hoteles) más rápido
+        # que el json.loads stdlib que usa response.json()
+        data = orjson.loads(response.content)
+
+        # Buscar el hotel específico en resultados
+        if "data" in data and "hotels" in data["data"]:
+            for hotel in data["data"]["hotels"]:
+                if str(hotel.get("hotel_id")) == hotel_id or hotel_name.lower() in hotel.get("property", {}).get("name", "").lower():
+                    price = hotel.get("property", {}).get("priceBreakdown", {}).get("grossPrice", {}).get("value", 0)
+                    if price > 0:
+                        price_per_night = price / nights if nights > 0 else price
+                        logger.info("✅ Booking.com: $%s/noche", price_per_night)
+                        return PriceResult(
+                            source="Booking.com",
+                            hotel_name=hotel_name,
+                            price_per_night=round(price_per_night, 2),
+                            total_price=round(price, 2),
+                            url=f"https://www.booking.com/hotel/{hotel_id}.html",
+                            last_updated=now_iso
+                        )
+
+        logger.warning("Hotel no encontrado en resultados de Booking.com")
+        return None
+
     except Exception as e:
-        print(f"[ERROR] Booking API error: {str(e)}")
+        logger.error("Booking API error: %s", e)
         return None
 
 
-async def fetch_expedia_price(hotel_name: str, checkin: str, checkout: str, guests: int):
+async def fetch_expedia_price(client: httpx.AsyncClient, hotel_name: str, checkin: str, checkout: str, guests: int, nights: int, now_iso: str):
     """Fetch real prices from Expedia API via RapidAPI"""
     if hotel_name not in HOTELS_CONFIG:
         return None
     
-    property_id = HOTELS_CONFIG[hotel_name]["expedia_id"]
-    
-    # Expedia API via RapidAPI
-    url = "https://hotels-com-provider.p.rapidapi.com/v2/hotels/search"
-    
-    headers = {
-        "X-RapidAPI-Key": RAPIDAPI_KEY,
-        "X-RapidAPI-Host": "hotels-com-provider.p.rapidapi.com"
-    }
-    
+    cfg = HOTELS_CONFIG[hotel_name]
+    property_id = cfg["expedia_id"]
+
     params = {
         "checkin_date": checkin,
         "checkout_date": checkout,
         "adults_number": guests,
         "domain": "US",
         "locale": "en_US",
-        "latitude": HOTELS_CONFIG[hotel_name]["latitude"],
-        "longitude": HOTELS_CONFIG[hotel_name]["longitude"],
+        "latitude": cfg["latitude"],
+        "longitude": cfg["longitude"],
         "units": "metric"
     }
     
     try:
-        print(f"[INFO] 🔍 Fetching Expedia/Hotels.com price for {hotel_name}...")
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            response = await client.get(url, headers=headers, params=params)
-            
-            if response.status_code != 200:
-                print(f"[ERROR] Expedia API status {response.status_code}")
-                return None
-            
-            data = response.json()
-            
-            # Buscar el hotel en resultados
-            if "properties" in data:
-                for prop in data["properties"]:
-                    if str(prop.get("id")) == property_id or hotel_name.lower() in prop.get("name", "").lower():
-                        price_info = prop.get("price", {})
-                        total = price_info.get("lead", {}).get("amount", 0)
-                        if total > 0:
-                            nights = (datetime.strptime(checkout, "%Y-%m-%d") - datetime.strptime(checkin, "%Y-%m-%d")).days
-                            price_per_night = total / nights if nights > 0 else total
-                            print(f"[INFO] ✅ Expedia: ${price_per_night}/noche")
-                            return PriceResult(
-                                source="Expedia",
-                                hotel_name=hotel_name,
-                                price_per_night=round(price_per_night, 2),
-                                total_price=round(total, 2),
-                                url=f"https://www.expedia.com/h{property_id}.Hotel-Information",
-                                last_updated=datetime.now().isoformat()
-                            )
-            
-            print(f"[WARN] Hotel no encontrado en resultados de Expedia")
+        logger.info("🔍 Fetching Expedia/Hotels.com price for %s...", hotel_name)
+        async with EXPEDIA_SEM:
+            response = await client.get(EXPEDIA_URL, headers=EXPEDIA_HEADERS, params=params)
+
+        if response.status_code != 200:
+            logger.error("Expedia API status %s", response.status_code)
             return None
-            
+
+        data = orjson.loads(response.content)
+
+        # Buscar el hotel en resultados
+        if "properties" in data:
+            for prop in data["properties"]:
+                if str(prop.get("id")) == property_id or hotel_name.lower() in prop.get("name", "").lower():
+                    price_info = prop.get("price", {})
+                    total = price_info.get("lead", {}).get("amount", 0)
+                    if total > 0:
+                        price_per_night = total / nights if nights > 0 else total
+                        logger.info("✅ Expedia: $%s/noche", price_per_night)
+                        return PriceResult(
+                            source="Expedia",
+                            hotel_name=hotel_name,
+                            price_per_night=round(price_per_night, 2),
+                            total_price=round(total, 2),
+                            url=f"https://www.expedia.com/h{property_id}.Hotel-Information",
+                            last_updated=now_iso
+                        )
+
+        logger.warning("Hotel no encontrado en resultados de Expedia")
+        return None
+
     except Exception as e:
-        print(f"[ERROR] Expedia API error: {str(e)}")
+        logger.error("Expedia API error: %s", e)
         return None
 
 
-async def fetch_despegar_price(hotel_name: str, checkin: str, checkout: str, guests: int):
+async def fetch_despegar_price(client: httpx.AsyncClient, hotel_name: str, checkin: str, checkout: str, guests: int, nights: int, now_iso: str):
     """Fetch price from Despegar - usando Hotels.com como proxy ya que comparten inventario"""
     # Despegar no tiene API pública fácil, usar Hotels.com como alternativa
     # O implementar scraping específico si es necesario
     try:
-        print(f"[INFO] 🔍 Fetching Despegar price (via Hotels.com) for {hotel_name}...")
-        result = await fetch_expedia_price(hotel_name, checkin, checkout, guests)
+        logger.info("🔍 Fetching Despegar price (via Hotels.com) for %s...", hotel_name)
+        result = await fetch_expedia_price(client, hotel_name, checkin, checkout, guests, nights, now_iso)
         if result:
             # Ajustar source y agregar variación pequeña
             result.source = "Despegar"
             result.price_per_night *= 1.02  # 2% más típico en Despegar
             result.total_price *= 1.02
             result.url = f"https://www.despegar.com.mx/hoteles/"
-            print(f"[INFO] ✅ Despegar: ${result.price_per_night}/noche")
+            logger.info("✅ Despegar: $%s/noche", result.price_per_night)
             return result
         return None
     except Exception as e:
-        print(f"[ERROR] Despegar fetch error: {str(e)}")
+        logger.error("Despegar fetch error: %s", e)
         return None
 
 
-async def get_mock_prices(destination: str, checkin: str, checkout: str, guests: int):
+async def get_mock_prices(destination: str, nights: int, now_iso: str):
     """Fallback si scraping falla"""
-    checkin_obj = datetime.strptime(checkin, "%Y-%m-%d")
-    checkout_obj = datetime.strptime(checkout, "%Y-%m-%d")
-    nights = (checkout_obj - checkin_obj).days
     base_price = 250
     return [
         PriceResult(
@@ -268,7 +481,7 @@ async def get_mock_prices(destination: str, checkin: str, checkout: str, guests:
             price_per_night=base_price * 1.1,
             total_price=base_price * 1.1 * nights,
             url=f"https://booking.com/search?dest={destination}",
-            last_updated=datetime.now().isoformat()
+            last_updated=now_iso
         ),
         PriceResult(
             source="Expedia",
@@ -276,7 +489,7 @@ async def get_mock_prices(destination: str, checkin: str, checkout: str, guests:
             price_per_night=base_price * 0.95,
             total_price=base_price * 0.95 * nights,
             url=f"https://expedia.com/search?dest={destination}",
-            last_updated=datetime.now().isoformat()
+            last_updated=now_iso
         ),
         PriceResult(
             source="Despegar",
@@ -284,11 +497,25 @@ async def get_mock_prices(destination: str, checkin: str, checkout: str, guests:
             price_per_night=base_price * 1.05,
             total_price=base_price * 1.05 * nights,
             url=f"https://despegar.com/search?dest={destination}",
-            last_updated=datetime.now().isoformat()
+            last_updated=now_iso
         ),
     ]
 
 
+@lru_cache(maxsize=1)
+def _iso_for_second(ts: int) -> str:
+    return datetime.fromtimestamp(ts).isoformat()
+
+
+def now_iso() -> str:
+    """Timestamp ISO con granularidad de segundo, memoizado.
+
+    Bajo carga se piden muchos timestamps por segundo; strftime/isoformat
+    solo se ejecuta cuando cambia el segundo actual.
+    """
+    return _iso_for_second(int(time.time()))
+
+
 @app.get("/status")
 async def status():
     return {
@@ -296,117 +523,204 @@ async def status():
         "service": "UVC Price Checker API",
         "version": "1.1.0",
         "cache_entries": len(price_cache),
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso()
     }
 
 
 @app.post("/api/check-prices", response_model=PriceComparison)
-async def check_prices(request: PriceRequest):
+async def check_prices(request: PriceRequest, http_request: Request):
     try:
-        checkin_obj = datetime.strptime(request.checkin, "%Y-%m-%d")
-        checkout_obj = datetime.strptime(request.checkout, "%Y-%m-%d")
-        if checkin_obj >= checkout_obj:
-            raise HTTPException(status_code=400, detail="Check-out debe ser después de check-in")
-        if checkin_obj < datetime.now():
-            raise HTTPException(status_code=400, detail="Check-in debe ser fecha futura")
-        nights = (checkout_obj - checkin_obj).days
+        # Formato y orden de fechas ya validados por el modelo (422 automático)
+        client = http_request.app.state.http
+        nights = (request.checkout - request.checkin).days
+        request_ts = now_iso()
 
         cache_key = make_cache_key(request)
         if not request.force_refresh:
             cached = get_cached_response(cache_key)
-            if cached:
-                return PriceComparison(**cached)
-
-        # Intentar fetch de APIs reales para hoteles específicos
-        fetch_tasks = []
-        
-        # Mapeo de destination a hotel name
-        hotel_mapping = {
-            "Secrets Puerto Los Cabos": "Secrets Puerto Los Cabos",
-            "Zoetry Los Cabos": "Zoetry Los Cabos",
-            "secrets": "Secrets Puerto Los Cabos",
-            "zoetry": "Zoetry Los Cabos"
-        }
-        
-        # Detectar qué hotel buscar
-        dest_lower = request.destination.lower()
-        target_hotel = None
-        for key, hotel in hotel_mapping.items():
-            if key.lower() in dest_lower:
-                target_hotel = hotel
-                break
-        
-        if target_hotel:
-            print(f"[INFO] Fetching prices for {target_hotel}")
-            # Fetch de las 3 agencias en paralelo
-            fetch_tasks = [
-                fetch_booking_price(target_hotel, request.checkin, request.checkout, request.guests),
-                fetch_expedia_price(target_hotel, request.checkin, request.checkout, request.guests),
-                fetch_despegar_price(target_hotel, request.checkin, request.checkout, request.guests)
-            ]
+            if cached is not None:
+                return Response(content=cached, media_type="application/json")
+            # Coalescing: si ya hay un fan-out en vuelo para esta clave,
+            # esperar su resultado en vez de lanzar otro.
+            pending = _inflight.get(cache_key)
+            if pending is not None:
+                # shield: la desconexión de un cliente no debe cancelar el
+                # resultado que comparten los demás
+                return await asyncio.shield(pending)
+            # Tras un restart la memoria está fría: probar la copia en SQLite.
+            persisted = db_get_cached(cache_key)
+            if persisted is not None:
+                payload, fresh = persisted
+                if fresh:
+                    price_cache[cache_key] = payload  # repoblar L1
+                    return Response(content=payload, media_type="application/json")
+                # Stale-while-revalidate: servir lo viejo y refrescar en background
+                revalidate = asyncio.create_task(build_comparison(client, request, cache_key, nights, request_ts))
+                _inflight[cache_key] = revalidate
+                revalidate.add_done_callback(lambda t: (_inflight.pop(cache_key, None), t.exception() if not t.cancelled() else None))
+                return Response(content=payload, media_type="application/json")
+
+        # Líder: publicar un Future para que los requests concurrentes con la
+        # misma clave esperen este fan-out en vez de lanzar el suyo.
+        fut: Optional[asyncio.Future] = None
+        if not request.force_refresh:
+            fut = asyncio.get_running_loop().create_future()
+            _inflight[cache_key] = fut
+        try:
+            response_obj = await build_comparison(client, request, cache_key, nights, request_ts)
+        except Exception as e:
+            if fut is not None:
+                fut.set_exception(e)
+                fut.exception()  # marcar como recuperada por si nadie más espera
+            raise
         else:
-            # Fallback: mock prices
-            print(f"[WARN] Hotel no reconocido: {request.destination}, usando mock data")
-            fetch_tasks = [
-                get_mock_prices(request.destination, request.checkin, request.checkout, request.guests)
-            ]
-        
-        results_sets = await asyncio.gather(*fetch_tasks, return_exceptions=True)
-        all_results: List[PriceResult] = []
-        for rs in results_sets:
-            if isinstance(rs, list):
-                all_results.extend(rs)
-            elif isinstance(rs, PriceResult):
-                all_results.append(rs)
-        
-        # Si no obtuvimos resultados de APIs, usar mock
-        if not all_results:
-            print(f"[WARN] No se obtuvieron precios de APIs, usando mock data")
-            mock_results = await get_mock_prices(request.destination, request.checkin, request.checkout, request.guests)
-            all_results.extend(mock_results)
-
-        prices = [r.price_per_night for r in all_results if r.price_per_night > 0]
-        lowest_price = min(prices) if prices else None
-        average_price = sum(prices) / len(prices) if prices else None
-
-        response_obj = PriceComparison(
-            destination=request.destination,
-            checkin=request.checkin,
-            checkout=request.checkout,
-            nights=nights,
-            results=all_results,
-            lowest_price=round(lowest_price, 2) if lowest_price else None,
-            average_price=round(average_price, 2) if average_price else None,
-            timestamp=datetime.now().isoformat()
-        )
-        set_cache(cache_key, response_obj.model_dump())
-        return response_obj
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=f"Formato de fecha inválido: {str(e)}")
+            if fut is not None:
+                fut.set_result(response_obj)
+            return response_obj
+        finally:
+            if fut is not None:
+                # Si el líder fue cancelado, except Exception no atrapa
+                # CancelledError: resolver el future para no colgar a los
+                # que esperan en asyncio.shield.
+                if not fut.done():
+                    fut.cancel()
+                # Solo retirar el future propio: un force_refresh concurrente
+                # no debe desalojar el fan-out de otro líder (o una
+                # revalidación en background) y duplicar llamadas upstream.
+                if _inflight.get(cache_key) is fut:
+                    _inflight.pop(cache_key, None)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener precios: {str(e)}")
 
 
+async def build_comparison(client: httpx.AsyncClient, request: PriceRequest, cache_key: str, nights: int, now_iso: str) -> PriceComparison:
+    """Fan-out a las agencias, arma la comparación y la deja cacheada."""
+    # Detectar qué hotel buscar
+    dest_lower = request.destination.lower()
+    target_hotel = next((hotel for key, hotel in HOTEL_LOOKUP if key in dest_lower), None)
+
+    # Las APIs reciben las fechas como string ISO: formatear una sola vez
+    checkin_s = request.checkin.isoformat()
+    checkout_s = request.checkout.isoformat()
+
+    used_mock = False
+    if target_hotel:
+        logger.info("Fetching prices for %s", target_hotel)
+        # Fetch de las 3 agencias en paralelo
+        fetch_tasks = [
+            fetch_booking_price(client, target_hotel, checkin_s, checkout_s, request.guests, nights, now_iso),
+            fetch_expedia_price(client, target_hotel, checkin_s, checkout_s, request.guests, nights, now_iso),
+            fetch_despegar_price(client, target_hotel, checkin_s, checkout_s, request.guests, nights, now_iso)
+        ]
+    else:
+        # Fallback: mock prices
+        logger.warning("Hotel no reconocido: %s, usando mock data", request.destination)
+        used_mock = True
+        fetch_tasks = [
+            get_mock_prices(request.destination, nights, now_iso)
+        ]
+
+    results_sets = await asyncio.gather(*fetch_tasks, return_exceptions=True)
+    all_results: List[PriceResult] = []
+    for rs in results_sets:
+        if isinstance(rs, list):
+            all_results.extend(rs)
+        elif isinstance(rs, PriceResult):
+            all_results.append(rs)
+
+    # Si no obtuvimos resultados de APIs, usar mock
+    if not all_results:
+        logger.warning("No se obtuvieron precios de APIs, usando mock data")
+        used_mock = True
+        mock_results = await get_mock_prices(request.destination, nights, now_iso)
+        all_results.extend(mock_results)
+
+    # Min y promedio en una sola pasada, sin lista intermedia
+    lowest_price = None
+    price_sum = 0.0
+    price_count = 0
+    for r in all_results:
+        p = r.price_per_night
+        if p > 0:
+            price_sum += p
+            price_count += 1
+            if lowest_price is None or p < lowest_price:
+                lowest_price = p
+    average_price = price_sum / price_count if price_count else None
+
+    response_obj = PriceComparison(
+        destination=request.destination,
+        checkin=checkin_s,
+        checkout=checkout_s,
+        nights=nights,
+        results=all_results,
+        lowest_price=round(lowest_price, 2) if lowest_price else None,
+        average_price=round(average_price, 2) if average_price else None,
+        timestamp=now_iso
+    )
+    # Serializar una sola vez: los mismos bytes sirven hits de memoria,
+    # la copia en SQLite y (TTL corto) los fallbacks mock
+    set_cache(cache_key, orjson.dumps(response_obj.model_dump()), negative=used_mock)
+    return response_obj
+
+
+# Payload 100% estático: serializar una sola vez al importar el módulo
+_DESTINATIONS_JSON = orjson.dumps({
+    "destinations": [
+        {"code": "CUN", "name": "Cancún", "country": "Mexico"},
+        {"code": "PUJ", "name": "Punta Cana", "country": "Dominican Republic"},
+        {"code": "CZM", "name": "Cozumel", "country": "Mexico"},
+        {"code": "PVR", "name": "Puerto Vallarta", "country": "Mexico"},
+        {"code": "CSL", "name": "Cabo San Lucas", "country": "Mexico"},
+    ]
+})
+
+
 @app.get("/api/destinations")
 async def get_destinations():
-    return {
-        "destinations": [
-            {"code": "CUN", "name": "Cancún", "country": "Mexico"},
-            {"code": "PUJ", "name": "Punta Cana", "country": "Dominican Republic"},
-            {"code": "CZM", "name": "Cozumel", "country": "Mexico"},
-            {"code": "PVR", "name": "Puerto Vallarta", "country": "Mexico"},
-            {"code": "CSL", "name": "Cabo San Lucas", "country": "Mexico"},
-        ]
-    }
+    return Response(content=_DESTINATIONS_JSON, media_type="application/json")
 
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles con memoización del lookup: los assets del frontend son
+    inmutables entre deploys, así que no hace falta un stat() por request."""
+
+    LOOKUP_TTL = 60.0
+    LOOKUP_MAX = 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lookup_cache: dict = {}
+
+    def lookup_path(self, path):
+        hit = self._lookup_cache.get(path)
+        now = time.monotonic()
+        if hit is not None and now - hit[0] < self.LOOKUP_TTL:
+            return hit[1]
+        result = super().lookup_path(path)
+        if len(self._lookup_cache) >= self.LOOKUP_MAX:
+            self._lookup_cache.clear()
+        self._lookup_cache[path] = (now, result)
+        return result
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        # Los assets cambian solo con deploys: dejar que el browser los cachee
+        response.headers.setdefault("Cache-Control", "public, max-age=3600")
+        return response
+
 
 # Mount static frontend (serve index.html) from TIMESHARE folder
-# This lets us host frontend and backend on the same Railway app
+# This lets us host frontend and backend on the same Railway app.
+# El mount con "/" va después de las rutas API a propósito: captura todo
+# lo que no matcheó antes, y debe registrarse antes del bloque __main__
+# para que también exista al correr `python backend/main.py`.
 try:
-    app.mount("/", StaticFiles(directory="TIMESHARE_netlify_FINAL", html=True), name="static")
+    app.mount("/", CachedStaticFiles(directory="TIMESHARE_netlify_FINAL", html=True), name="static")
 except Exception as e:
-    print(f"[WARN] Static mount failed: {e}")
+    logger.warning("Static mount failed: %s", e)
+
+if __name__ == "__main__":
+    import uvicorn
+    # access_log off: timing_middleware ya loguea cada request
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools", access_log=False)
@@ -3,4 +3,4 @@ from backend.main import app
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000)
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, loop="uvloop", http="httptools", access_log=False)
@@ -1,6 +1,11 @@
 # ahorro_membresia.py
 # Simulador de ahorro con la membresía UVC
 
+import math
+
+import numpy as np
+
+
 def pedir_float(mensaje, valor_default=None):
     """
     Pide un número flotante por consola.
@@ -51,41 +56,56 @@ def simulador_ahorro():
 
     print("\nCalculando escenario...\n")
 
-    # --- Cálculo ---
-    acumulado_retail = 0.0
-    acumulado_membresia = costo_membresia  # se paga al inicio
-
-    anio_quiebre = None  # año en que la membresía se paga sola
-
-    filas = []
-    for anio in range(1, anios + 1):
-        # El retail sube cada año por inflación
-        precio_retail_anio = precio_retail * ((1 + inflacion) ** (anio - 1))
-
-        # El precio con membresía lo dejamos fijo
-        precio_mayoreo_anio = precio_mayoreo
+    # --- Cálculo (forma cerrada, sin acumulación año a año) ---
+    anios_idx = np.arange(1, anios + 1)
 
-        gasto_retail_anio = precio_retail_anio * viajes_por_anio
-        gasto_membresia_anio = precio_mayoreo_anio * viajes_por_anio
+    # El retail sube cada año por inflación; el precio con membresía es fijo
+    precio_retail_anios = precio_retail * (1 + inflacion) ** (anios_idx - 1)
 
-        acumulado_retail += gasto_retail_anio
-        acumulado_membresia += gasto_membresia_anio
+    gasto_retail = precio_retail_anios * viajes_por_anio
+    gasto_membresia = np.full(anios, precio_mayoreo * viajes_por_anio)
 
-        ahorro_acumulado = acumulado_retail - acumulado_membresia
-
-        if anio_quiebre is None and ahorro_acumulado >= 0:
-            anio_quiebre = anio
-
-        filas.append({
-            "anio": anio,
-            "precio_retail": precio_retail_anio,
-            "precio_mayoreo": precio_mayoreo_anio,
-            "gasto_retail": gasto_retail_anio,
-            "gasto_membresia": gasto_membresia_anio,
-            "acum_retail": acumulado_retail,
-            "acum_membresia": acumulado_membresia,
-            "ahorro": ahorro_acumulado,
-        })
+    # El acumulado retail es una serie geométrica de razón (1 + inflación):
+    #   S_n = retail·viajes·((1+i)^n − 1)/i   (límite: retail·viajes·n si i=0)
+    # y el acumulado con membresía es lineal (la membresía se paga al inicio).
+    if inflacion != 0.0:
+        acum_retail = precio_retail * viajes_por_anio * ((1 + inflacion) ** anios_idx - 1) / inflacion
+    else:
+        acum_retail = precio_retail * viajes_por_anio * anios_idx.astype(float)
+    acum_membresia = costo_membresia + precio_mayoreo * viajes_por_anio * anios_idx
+    ahorro = acum_retail - acum_membresia
+
+    # Año en que la membresía se paga sola. Sin inflación ambos acumulados
+    # son lineales y el cruce se despeja directo; con inflación la ecuación
+    # lineal-vs-geométrica es trascendental, así que se escanea el arreglo.
+    if inflacion == 0.0:
+        ahorro_anual = (precio_retail - precio_mayoreo) * viajes_por_anio
+        if ahorro_anual > 0:
+            anio_quiebre = max(math.ceil(costo_membresia / ahorro_anual), 1)
+            if anio_quiebre > anios:
+                anio_quiebre = None
+        else:
+            anio_quiebre = None
+    else:
+        positivos = np.nonzero(ahorro >= 0)[0]
+        anio_quiebre = int(positivos[0]) + 1 if positivos.size else None
+
+    acumulado_retail = float(acum_retail[-1])
+    acumulado_membresia = float(acum_membresia[-1])
+
+    filas = [
+        {
+            "anio": int(anio),
+            "gasto_retail": float(gr),
+            "gasto_membresia": float(gm),
+            "acum_retail": float(ar),
+            "acum_membresia": float(am),
+            "ahorro": float(ah),
+        }
+        for anio, gr, gm, ar, am, ah in zip(
+            anios_idx, gasto_retail, gasto_membresia, acum_retail, acum_membresia, ahorro
+        )
+    ]
 
     # --- Mostrar tabla resumen ---
     print("=" * 90)
@@ -19,12 +19,13 @@ Para generar todas las entradas definidas en CONFIG_PRESETS:
 python scripts/update_prices.py --all
 """
 from __future__ import annotations
-import json
-import random
 import argparse
-from datetime import datetime
+from datetime import date, datetime
 from pathlib import Path
 
+import numpy as np
+import orjson
+
 OUTPUT_FILE = Path(__file__).parent.parent / 'prices-cache.json'
 
 # Preconfiguraciones de destinos frecuentes
@@ -62,10 +63,17 @@ BASE_PRICE_BY_DEST = {
 
 CURRENCY = "USD"
 
+# Un solo draw vectorizado por destino en vez de un random.uniform por fuente
+rng = np.random.default_rng()
+_LOWS = np.array([low for low, _ in SOURCE_VARIATION.values()])
+_HIGHS = np.array([high for _, high in SOURCE_VARIATION.values()])
+
 
 def compute_nights(checkin: str, checkout: str) -> int:
-    ci = datetime.fromisoformat(checkin)
-    co = datetime.fromisoformat(checkout)
+    # date.fromisoformat: fast path en C, y las fechas de los presets no
+    # llevan componente de hora
+    ci = date.fromisoformat(checkin)
+    co = date.fromisoformat(checkout)
     return (co - ci).days
 
 
@@ -73,16 +81,14 @@ def generate_prices_for_destination(dest: str, checkin: str, checkout: str) -> d
     base = BASE_PRICE_BY_DEST.get(dest.lower(), 190)
     nights = compute_nights(checkin, checkout)
 
-    sources_block = {}
-    collected_prices = []
-
-    for name, (low_factor, high_factor) in SOURCE_VARIATION.items():
-        price = round(base * random.uniform(low_factor, high_factor))
-        sources_block[name] = {"price": price, "currency": CURRENCY}
-        collected_prices.append(price)
+    prices = np.round(base * rng.uniform(_LOWS, _HIGHS)).astype(int)
+    sources_block = {
+        name: {"price": price, "currency": CURRENCY}
+        for name, price in zip(SOURCE_VARIATION, prices.tolist())
+    }
 
-    lowest = min(collected_prices)
-    avg = round(sum(collected_prices) / len(collected_prices), 2)
+    lowest = int(prices.min())
+    avg = round(float(prices.mean()), 2)
 
     return {
         "destination": dest,
@@ -105,8 +111,8 @@ def build_cache(entries: list[dict]) -> dict:
 
 
 def write_cache(cache: dict):
-    with OUTPUT_FILE.open('w', encoding='utf-8') as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
+    # orjson emite bytes UTF-8 directamente (sin re-encode ni escape ASCII)
+    OUTPUT_FILE.write_bytes(orjson.dumps(cache, option=orjson.OPT_INDENT_2))
     print(f"✅ Cache actualizado: {OUTPUT_FILE}")
 
 